@@ -0,0 +1,346 @@
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import proton_vault
+
+
+#-------------------- Synthetic export --------------------#
+
+
+_WORDS = (
+    "account", "admin", "bank", "blog", "cloud", "code", "game", "home", "mail", "market", "music", "news",
+    "office", "pay", "photo", "portal", "shop", "social", "store", "travel", "video", "wiki", "work", "forum",
+)
+_TLDS = ("com", "org", "net", "fr", "de", "io", "co.uk", "com.au")
+_PASSWORD_CHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789!#$%&*+-=?@^_"
+_TEXT_CHARS = "abcdefghijklmnopqrstuvwxyz     éàè.,\n"
+_ID_CHARS = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789"
+_DEFAULT_TYPE_MIX = {"login": 0.7, "note": 0.15, "alias": 0.15}
+
+
+def _random_id(rng):
+    return ''.join(rng.choice(_ID_CHARS) for _ in range(86)) + '=='
+
+
+def _random_text(rng, size):
+    return ''.join(rng.choice(_TEXT_CHARS) for _ in range(size))
+
+
+def _random_url(rng):
+    host = rng.choice(_WORDS) + str(rng.randrange(1000)) + "." + rng.choice(_TLDS)
+    if rng.random() < 0.4:
+        host = rng.choice(("www", "login", "auth", "my", "app")) + "." + host
+    return "https://" + host + "/" + rng.choice(_WORDS)
+
+
+def _random_item(rng, share_id, type_mix, note_size, url_count):
+    """
+    Builds a random export item, as found in a Proton Pass JSON export.
+    :param rng: The random.Random generator.
+    :param share_id: The ID of the vault of the item.
+    :param type_mix: A dictionary of item type weights.
+    :param note_size: The average number of characters of the notes.
+    :param url_count: The average number of URLs of the logins.
+    :return: A dictionary of the item.
+    """
+    item_type = rng.choices(list(type_mix), weights=list(type_mix.values()))[0]
+    name = rng.choice(_WORDS).capitalize() + " " + str(rng.randrange(100000))
+    note = _random_text(rng, rng.randint(0, 2 * note_size)) if note_size and rng.random() < 0.5 else ""
+    if item_type == "note":
+        note = _random_text(rng, rng.randint(note_size // 2, 2 * note_size + 1))
+    content = {}
+    extra_fields = []
+    alias_email = None
+    if item_type == "login":
+        content = {
+            "itemEmail": "",
+            "username": rng.choice(_WORDS) + str(rng.randrange(1000)) + "@example.com",
+            "password": ''.join(rng.choice(_PASSWORD_CHARS) for _ in range(rng.randint(6, 24))),
+            "urls": [_random_url(rng) for _ in range(rng.randint(0, 2 * url_count))],
+            "totpUri": "otpauth://totp/{}?secret={}".format(name.replace(" ", ""), _random_id(rng)[:32]) if rng.random() < 0.2 else "",
+            "passkeys": []
+        }
+        if rng.random() < 0.1:
+            extra_fields.append({"fieldName": "PIN", "type": "hidden", "data": {"content": str(rng.randrange(10000))}})
+    elif item_type == "alias":
+        alias_email = rng.choice(_WORDS) + "." + str(rng.randrange(100000)) + "@passmail.net"
+    create_time = 1600000000 + rng.randrange(100000000)
+    return {
+        "itemId": _random_id(rng),
+        "shareId": share_id,
+        "data": {
+            "metadata": {"name": name, "note": note, "itemUuid": "{:08x}".format(rng.getrandbits(32))},
+            "extraFields": extra_fields,
+            "type": item_type,
+            "content": content,
+            "lastRevision": rng.randint(1, 10)
+        },
+        "state": 1 if rng.random() < 0.95 else 2,
+        "aliasEmail": alias_email,
+        "contentFormatVersion": 1,
+        "createTime": create_time,
+        "modifyTime": create_time + rng.randrange(10000000),
+        "pinned": rng.random() < 0.05
+    }
+
+
+def write_synthetic_export(file_path, vaults=5, items=10000, seed=0, note_size=40, url_count=1, type_mix=None):
+    """
+    Writes a deterministic synthetic Proton Pass JSON export, item by item (an export of 1M items is never held
+    in memory). The same parameters always give the same file.
+    :param file_path: The path to the JSON file.
+    :param vaults: The number of vaults.
+    :param items: The total number of items, spread over the vaults.
+    :param seed: The seed of the random generator.
+    :param note_size: The average number of characters of the notes.
+    :param url_count: The average number of URLs of the logins.
+    :param type_mix: A dictionary of item type weights (login, note, alias).
+    :return: The size of the file in bytes.
+    """
+    rng = random.Random(seed)
+    type_mix = type_mix or _DEFAULT_TYPE_MIX
+    with open(file_path, 'w', encoding='utf-8') as file:
+        file.write('{"version": "1.21.2", "userId": ' + json.dumps(_random_id(rng)) + ', "encrypted": false, "vaults": {')
+        for vault_index in range(vaults):
+            vault_id = _random_id(rng)
+            count = items // vaults + (1 if vault_index < items % vaults else 0)
+            header = {"name": "Vault {}".format(vault_index), "description": _random_text(rng, 20),
+                      "display": {"color": rng.randrange(10), "icon": rng.randrange(20)}}
+            file.write((', ' if vault_index else '') + json.dumps(vault_id) + ': ' + json.dumps(header)[:-1] + ', "items": [')
+            for item_index in range(count):
+                item = _random_item(rng, vault_id, type_mix, note_size, url_count)
+                file.write((', ' if item_index else '') + json.dumps(item))
+            file.write(']}')
+        file.write('}}')
+    return os.path.getsize(file_path)
+
+
+#-------------------- Measures --------------------#
+
+
+def _timed(function, repeat):
+    """
+    Runs a function several times, with a garbage collection before each run.
+    :param function: The function to run.
+    :param repeat: The number of runs.
+    :return: A (list of durations in seconds, result of the last run) tuple.
+    """
+    durations = []
+    result = None
+    for _ in range(repeat):
+        result = None
+        gc.collect()
+        start = time.perf_counter()
+        result = function()
+        durations.append(time.perf_counter() - start)
+    return durations, result
+
+
+def _peak_memory(function):
+    """
+    Measures the peak of the memory allocated by Python while running a function, with tracemalloc.
+    :param function: The function to run.
+    :return: The peak in bytes.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _latency(function, arguments):
+    """
+    Measures the latency of a function called once per argument.
+    :param function: The function to call.
+    :param arguments: The list of arguments.
+    :return: A dictionary of latency statistics in microseconds.
+    """
+    samples = []
+    for argument in arguments:
+        start = time.perf_counter()
+        function(argument)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        "count": len(samples),
+        "mean_us": statistics.fmean(samples),
+        "p50_us": samples[len(samples) // 2],
+        "p99_us": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+        "max_us": samples[-1],
+    }
+
+
+def _result(name, durations, **extra):
+    result = {"benchmark": name, "seconds": min(durations), "runs": durations}
+    result.update(extra)
+    return result
+
+
+def run_benchmarks(export_path, repeat=3, lookups=10000, memory=True, seed=0, workers=None):
+    """
+    Runs the benchmarks on an export: load (eager and lazy), save (first and unchanged), round trip,
+    parallel load and save, peak memory of the loads and lookup latencies (hits and misses).
+    :param export_path: The path to the JSON export.
+    :param repeat: The number of runs of each timed benchmark (the best one is reported as "seconds").
+    :param lookups: The number of lookups of each latency benchmark.
+    :param memory: Measure the peak memory of the loads (with tracemalloc, much slower than the timed runs).
+    :param seed: The seed of the random choice of the looked up IDs.
+    :param workers: The number of worker processes of the parallel load and save (one per CPU by default, none if 0).
+    :return: A list of result dictionaries.
+    """
+    results = []
+    workers = (os.cpu_count() or 1) if workers is None else workers
+    size = os.path.getsize(export_path)
+    load = proton_vault.load_password_manager_from_json_file
+
+    durations, pm = _timed(lambda: load(export_path), repeat)
+    item_count = sum(len(vault.items) for vault in pm.vaults.values())
+    results.append(_result("load", durations, items=item_count, bytes=size, mb_per_s=size / min(durations) / 1e6))
+    lazy_durations, _ = _timed(lambda: load(export_path, lazy=True), repeat)
+    results.append(_result("load_lazy", lazy_durations, items=item_count, bytes=size))
+    if workers:
+        # The speedup includes the start of the worker processes, as paid by each call
+        parallel_durations, _ = _timed(lambda: load(export_path, parallel=workers), repeat)
+        results.append(_result("load_parallel", parallel_durations, items=item_count, workers=workers,
+                               speedup=min(durations) / min(parallel_durations)))
+
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, "out.json")
+
+        durations, _ = _timed(lambda: proton_vault.save_password_manager_to_json_file(pm, output), repeat)
+        results.append(_result("save", durations, items=item_count, bytes=os.path.getsize(output)))
+        if workers:
+            parallel_durations, _ = _timed(lambda: proton_vault.save_password_manager_to_json_file(pm, output, parallel=workers), repeat)
+            results.append(_result("save_parallel", parallel_durations, items=item_count, workers=workers,
+                                   speedup=min(durations) / min(parallel_durations)))
+        # Saves reusing the JSON of the unchanged items, cached by a first tracked save
+        pm.track_changes = True
+        proton_vault.save_password_manager_to_json_file(pm, output)
+        durations, _ = _timed(lambda: proton_vault.save_password_manager_to_json_file(pm, output), repeat)
+        results.append(_result("save_unchanged", durations, items=item_count))
+        pm.track_changes = False
+        durations, _ = _timed(lambda: proton_vault.save_password_manager_to_json_file(load(output), output), repeat)
+        results.append(_result("round_trip", durations, items=item_count))
+
+    if memory:
+        results.append({"benchmark": "peak_memory_load", "bytes": _peak_memory(lambda: load(export_path)), "items": item_count})
+        results.append({"benchmark": "peak_memory_load_lazy", "bytes": _peak_memory(lambda: load(export_path, lazy=True)), "items": item_count})
+
+    rng = random.Random(seed)
+    vaults = list(pm.vaults.values())
+    items = [(vault, item) for vault in vaults for item in vault.items]
+    sample = [rng.choice(items) for _ in range(lookups)] if items else []
+    results.append(dict(benchmark="find_item", **_latency(pm.find_item, [item.itemId for _, item in sample])))
+    results.append(dict(benchmark="find_item_by_uuid", **_latency(pm.find_item_by_uuid, [item.data.metadata.itemUuid for _, item in sample])))
+    results.append(dict(benchmark="vault_get_item", **_latency(lambda pair: pair[0].get_item(pair[1].itemId), sample)))
+    results.append(dict(benchmark="get_vault", **_latency(pm.get_vault, [vault.name for vault, _ in sample])))
+    # Misses must not fall back to a scan of the items
+    missing = ["missing-{}".format(i) for i in range(lookups)]
+    results.append(dict(benchmark="find_item_miss", **_latency(pm.find_item, missing)))
+    results.append(dict(benchmark="find_item_by_uuid_miss", **_latency(pm.find_item_by_uuid, missing)))
+    results.append(dict(benchmark="vault_get_item_miss", **_latency(lambda pair: pair[0].get_item(pair[1]), zip([vault for vault, _ in sample], missing))))
+    results.append(dict(benchmark="get_vault_miss", **_latency(pm.get_vault, missing)))
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current):
+    """
+    Prints the change of each benchmark between two result documents.
+    :param previous: The previous result document.
+    :param current: The current result document.
+    """
+    def metric(result):
+        return result.get("seconds", result.get("mean_us", result.get("bytes")))
+
+    old = {result["benchmark"]: metric(result) for result in previous["results"]}
+    print("{:<24} {:>14} {:>14} {:>9}".format("benchmark", previous["meta"].get("commit") and previous["meta"]["commit"][:12] or "previous",
+                                            current["meta"].get("commit") and current["meta"]["commit"][:12] or "current", "change"))
+    for result in current["results"]:
+        before, after = old.get(result["benchmark"]), metric(result)
+        change = "{:+.1f}%".format((after - before) / before * 100) if before else "n/a"
+        print("{:<24} {:>14.6g} {:>14.6g} {:>9}".format(result["benchmark"], before or 0, after, change))
+
+
+def _type_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks of proton_vault on a synthetic Proton Pass export.")
+    parser.add_argument("--vaults", type=int, default=5, help="number of vaults (default 5)")
+    parser.add_argument("--items", type=int, default=10000, help="total number of items, ex 1000 to 1000000 (default 10000)")
+    parser.add_argument("--note-size", type=int, default=40, help="average number of characters of the notes (default 40)")
+    parser.add_argument("--urls", type=int, default=1, help="average number of URLs of the logins (default 1)")
+    parser.add_argument("--type-mix", type=_type_mix, default=_DEFAULT_TYPE_MIX, help="item type weights (default login=0.7,note=0.15,alias=0.15)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic export (default 0)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each timed benchmark, the best one is kept (default 3)")
+    parser.add_argument("--lookups", type=int, default=10000, help="lookups of each latency benchmark (default 10000)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory measures")
+    parser.add_argument("--workers", type=int, help="worker processes of the parallel load and save (default one per CPU, 0 to skip)")
+    parser.add_argument("--export", help="use or keep the synthetic export at this path instead of a temporary file")
+    parser.add_argument("--output", help="write the JSON results to this file instead of the standard output")
+    parser.add_argument("--compare", help="print the change against a previous JSON results file")
+    args = parser.parse_args(argv)
+
+    parameters = {"vaults": args.vaults, "items": args.items, "note_size": args.note_size, "urls": args.urls,
+                  "type_mix": args.type_mix, "seed": args.seed, "repeat": args.repeat, "lookups": args.lookups,
+                  "workers": args.workers}
+    with tempfile.TemporaryDirectory() as directory:
+        export_path = args.export or os.path.join(directory, "export.json")
+        if not os.path.exists(export_path):
+            start = time.perf_counter()
+            write_synthetic_export(export_path, args.vaults, args.items, args.seed, args.note_size, args.urls, args.type_mix)
+            print("Generated {} ({} bytes) in {:.2f} s".format(export_path, os.path.getsize(export_path), time.perf_counter() - start), file=sys.stderr)
+        results = run_benchmarks(export_path, args.repeat, args.lookups, not args.no_memory, args.seed, args.workers)
+
+    document = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "parameters": parameters,
+        },
+        "results": results,
+    }
+    text = json.dumps(document, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as file:
+            compare(json.load(file), document)
+
+
+if __name__ == '__main__':
+    main()
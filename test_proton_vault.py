@@ -0,0 +1,1350 @@
+"""
+Tests of proton_vault, one test case per feature; the load paths must give back the JSON of the baseline load.
+Run with: python -m pytest (or python -m unittest).
+"""
+import asyncio
+import concurrent.futures
+import contextlib
+import datetime
+import gc
+import io
+import json
+import marshal
+import math
+import os
+import pickle
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+import zipfile
+from unittest import mock
+
+import benchmark
+import proton_vault
+
+
+def make_export(vaults=3, items=40):
+    """
+    Builds a small export whose numbers and escaped strings are split at many positions by small chunks.
+    :param vaults: The number of vaults.
+    :param items: The number of items per vault.
+    :return: The export dictionary.
+    """
+    export = {"encrypted": False, "userId": "USER==", "version": "1.1.0", "vaults": {}}
+    for v in range(vaults):
+        vault_id = "V{}{}==".format(v, "x" * 40)
+        vault_items = []
+        for i in range(items):
+            vault_items.append({
+                "itemId": "I{}_{}==".format(v, i),
+                "shareId": vault_id,
+                "data": {
+                    "metadata": {"name": "Item é \"{}\" \\ \U0001f511".format(i), "note": "line\n{}\t ".format(i),
+                             "itemUuid": "uuid-{}-{}".format(v, i)},
+                    "extraFields": [{"fieldName": "pin", "type": "hidden", "data": {"content": str(1234 + i)}}] if i % 5 == 0 else [],
+                    "type": "login" if i % 2 else "note",
+                    "content": {"username": "user{}".format(i), "password": "päss{}".format(i),
+                                "urls": ["https://example{}.com/a?b=c".format(i % 4)], "totpUri": "", "passkeys": []} if i % 2 else {},
+                    "lastRevision": 12345678901234567890 + i
+                },
+                "state": 1 + i % 2,
+                "aliasEmail": None,
+                "contentFormatVersion": 1,
+                "createTime": 1680000000 + i * 123457,
+                "modifyTime": -1.25e-7 * i if i % 7 == 3 else 1690000000 + i * 98765,
+                "pinned": i % 3 == 0
+            })
+        export["vaults"][vault_id] = {"name": "Vault {}".format(v), "description": "désc",
+                                      "display": {"color": v, "icon": 2}, "items": vault_items}
+    return export
+
+
+def build_password_manager(export):
+    """
+    Builds the baseline password manager of an export with the public API, without the streaming loader.
+    :param export: The export dictionary.
+    :return: The PasswordManager object.
+    """
+    pm = proton_vault.PasswordManager(version=export["version"], user_id=export["userId"], encrypted=export["encrypted"])
+    for vault_id, vault_data in export["vaults"].items():
+        display = proton_vault.Display.from_dict(vault_data["display"])
+        vault = pm.add_vault(vault_id=vault_id, name=vault_data["name"], description=vault_data["description"], display=display)
+        for item_data in vault_data["items"]:
+            data = item_data["data"]
+            content = data["content"]
+            vault.add_item(
+                itemId=item_data["itemId"],
+                data=proton_vault.Data(
+                    proton_vault.Metadata(data["metadata"]["name"], data["metadata"]["note"], data["metadata"]["itemUuid"]),
+                    data["extraFields"],
+                    data["type"],
+                    proton_vault.Content(content.get("username"), content.get("password"), content.get("urls", []),
+                                         content.get("totpUri")),
+                    data.get("lastRevision")
+                ),
+                state=item_data["state"],
+                aliasEmail=item_data["aliasEmail"],
+                contentFormatVersion=item_data["contentFormatVersion"],
+                createTime=item_data["createTime"],
+                modifyTime=item_data["modifyTime"]
+            )
+    return pm
+
+
+class StreamingReaderTest(unittest.TestCase):
+    """
+    Tests of _JsonStreamReader on chunks small enough to split every number and string.
+    """
+    def setUp(self):
+        self.export = make_export(vaults=2, items=6)
+        self.text = json.dumps(self.export, indent=2, ensure_ascii=False)
+
+    def test_values_split_across_chunks(self):
+        for chunk_size in list(range(1, 40)) + [97, 1000]:
+            reader = proton_vault._JsonStreamReader(io.StringIO(self.text), chunk_size=chunk_size)
+            decoded = {key: reader.read_value() for key in reader.iter_object()}
+            self.assertEqual(decoded, self.export, "chunk size {}".format(chunk_size))
+
+    def test_value_texts_split_across_chunks(self):
+        expected = {key: json.dumps(value) for key, value in self.export["vaults"].items()}
+        for chunk_size in (1, 2, 3, 7, 13):
+            reader = proton_vault._JsonStreamReader(io.StringIO(json.dumps(self.export)), chunk_size=chunk_size)
+            texts = {}
+            for key in reader.iter_object():
+                if key != "vaults":
+                    reader.read_value()
+                    continue
+                for vault_id in reader.iter_object():
+                    texts[vault_id] = reader.read_value(with_text=True)[1]
+            self.assertEqual(texts, expected, "chunk size {}".format(chunk_size))
+
+    def test_error_position_in_document(self):
+        text = '"aliasEmail": nul'.join(self.text.rsplit('"aliasEmail": null', 1))
+        with self.assertRaises(json.JSONDecodeError) as expected:
+            json.loads(text)
+        for chunk_size in (1, 5, 64):
+            reader = proton_vault._JsonStreamReader(io.StringIO(text), chunk_size=chunk_size)
+            with self.assertRaises(json.JSONDecodeError) as error:
+                for _ in reader.iter_object():
+                    reader.read_value()
+            self.assertEqual((error.exception.lineno, error.exception.colno),
+                             (expected.exception.lineno, expected.exception.colno))
+
+
+class ExportTestCase(unittest.TestCase):
+    """
+    Base class of the tests run on an export file: the export of make_export() written to a temporary directory,
+    and the password manager built from it like the original loader did (see build_password_manager).
+    """
+    passphrase = "correct horse"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.export = make_export()
+        cls.json_path = os.path.join(cls.directory, "export.json")
+        with open(cls.json_path, "w", encoding="utf-8") as file:
+            json.dump(cls.export, file, indent=4, ensure_ascii=False)
+        cls.baseline = build_password_manager(cls.export)
+        cls.expected = [cls.baseline.to_json(), cls.baseline.to_json(indent=4)]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def load(self, source=None, **kwargs):
+        return proton_vault.load_password_manager_from_json_file(source or self.json_path, **kwargs)
+
+    def assertSameExport(self, pm, message=None):
+        self.assertEqual([pm.to_json(), pm.to_json(indent=4)], self.expected, message)
+
+    def assertRoundTrip(self, source, **kwargs):
+        for lazy in (False, True):
+            self.assertSameExport(self.load(source, lazy=lazy, **kwargs), "lazy={} {}".format(lazy, kwargs))
+
+
+class LoadRoundTripTest(ExportTestCase):
+    """
+    Tests that every load path gives back, byte for byte, the JSON of the baseline (non streaming) load.
+    """
+    def test_eager_and_lazy(self):
+        self.assertRoundTrip(self.json_path)
+
+
+class Label(str):
+    """
+    A string subclass, which marshal cannot encode.
+    """
+
+
+class ParallelTest(ExportTestCase):
+    """
+    Tests of the parallel loads and saves, in worker processes and in threads.
+    """
+    def test_load(self):
+        self.assertRoundTrip(self.json_path, parallel=2)
+        with concurrent.futures.ThreadPoolExecutor(2) as executor:
+            self.assertRoundTrip(self.json_path, parallel=executor)
+
+    def test_save(self):
+        for lazy in (False, True):
+            pm = self.load(lazy=lazy)
+            with concurrent.futures.ThreadPoolExecutor(2) as executor:
+                for parallel in (2, executor):
+                    for indent in (None, 4):
+                        self.assertEqual(pm.to_json(indent=indent, parallel=parallel), self.expected[indent is not None])
+            if lazy:
+                self.assertFalse(any(item.is_materialized for vault in pm.vaults.values() for item in vault.items))
+
+    def test_save_items_marshal_cannot_encode(self):
+        pm = self.load()
+        first, second, third = pm.vaults.values()
+        first.items[0].data.metadata.name = Label("label")
+        second.items[0].data.metadata = {"name": "not a Metadata object"}
+        self.assertIsNone(proton_vault._vault_columns(first))
+        self.assertIsNotNone(proton_vault._vault_columns(second))
+        self.assertEqual(pm.to_json(parallel=2), pm.to_json())
+
+    def test_columns_are_compact(self):
+        # Worker processes send back marshalled columns, not pickled Vault, Item and Data objects
+        vault_id, vault = next(iter(self.export["vaults"].items()))
+        for lazy in (False, True):
+            columns = proton_vault._vault_columns_from_json(vault_id, json.dumps(vault), lazy)
+            built = proton_vault._vault_from_columns(*marshal.loads(columns), lazy=lazy)
+            self.assertEqual(built.to_json(), self.baseline.vaults[vault_id].to_json())
+            self.assertLess(len(columns), len(pickle.dumps(built)))
+            self.assertLess(len(proton_vault._vault_columns(built)), len(pickle.dumps(built)))
+
+
+class IterItemsTest(ExportTestCase):
+    """
+    Tests of iter_items, which streams the items of an export one at a time.
+    """
+    def expected_items(self, vault_ids=None):
+        return [(vault_id, vault.name, item.to_dict()) for vault_id, vault in self.baseline.vaults.items()
+                if vault_ids is None or vault_id in vault_ids for item in vault.items]
+
+    def test_items_in_file_order(self):
+        for lazy in (False, True):
+            items = [(vault_id, name, item.to_dict()) for vault_id, name, item in proton_vault.iter_items(self.json_path, lazy=lazy)]
+            self.assertEqual(items, self.expected_items())
+
+    def test_vault_selection(self):
+        first, second, _ = self.baseline.vaults
+        items = [(vault_id, name, item.to_dict()) for vault_id, name, item in proton_vault.iter_items(self.json_path, [first, "Vault 1"])]
+        self.assertEqual(items, self.expected_items({first, second}))
+
+    def test_items_before_vault_fields(self):
+        # The items of a vault listed before its name are buffered until the end of the vault
+        export = make_export(vaults=2, items=5)
+        for vault in export["vaults"].values():
+            vault["items"] = vault.pop("items")
+            vault["name"] = vault.pop("name")
+        with open(self.path("reordered.json"), "w", encoding="utf-8") as file:
+            json.dump(export, file)
+        with open(self.path("reordered.json"), "rb") as file:
+            items = [(vault_id, name, item.itemId) for vault_id, name, item in proton_vault.iter_items(file)]
+        self.assertEqual(items, [(vault_id, vault["name"], item["itemId"])
+                                 for vault_id, vault in export["vaults"].items() for item in vault["items"]])
+
+    def test_early_close(self):
+        items = proton_vault.iter_items(self.json_path)
+        self.assertEqual(next(items)[2].itemId, "I0_0==")
+        items.close()
+
+
+class SaveTest(ExportTestCase):
+    """
+    Tests of the streaming writer behind save_password_manager_to_json_file.
+    """
+    def test_same_json_as_json_dumps(self):
+        for indent in (None, 2, 4):
+            stream = io.StringIO()
+            self.baseline.write_json(stream, indent=indent, chunk_size=7)
+            self.assertEqual(stream.getvalue(), json.dumps(self.baseline.to_dict(), indent=indent))
+
+    def test_save_and_load(self):
+        for atomic in (False, True):
+            path = self.path("saved.json")
+            proton_vault.save_password_manager_to_json_file(self.baseline, path, atomic=atomic)
+            self.assertSameExport(self.load(path))
+
+    def test_atomic_save_permissions(self):
+        path = self.path("atomic.json")
+        proton_vault.save_password_manager_to_json_file(self.baseline, path, atomic=True)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+        self.assertEqual([name for name in os.listdir(self.directory) if name.endswith(".tmp")], [])
+
+    def test_failed_atomic_save_keeps_the_file(self):
+        path = self.path("kept.json")
+        with open(path, "w") as file:
+            file.write("previous")
+        with mock.patch.object(proton_vault.Vault, "_iter_json", side_effect=RuntimeError("failed")):
+            with self.assertRaises(RuntimeError):
+                proton_vault.save_password_manager_to_json_file(self.baseline, path, atomic=True)
+        with open(path) as file:
+            self.assertEqual(file.read(), "previous")
+        self.assertEqual([name for name in os.listdir(self.directory) if name.endswith(".tmp")], [])
+
+
+class LazyItemTest(ExportTestCase):
+    """
+    Tests of the lazily materialized items of a lazy load.
+    """
+    def test_items_keep_the_text_of_their_data(self):
+        pm = self.load(lazy=True)
+        for vault_id, vault in pm.vaults.items():
+            for item, item_data in zip(vault.items, self.export["vaults"][vault_id]["items"]):
+                self.assertFalse(item.is_materialized)
+                self.assertNotIn("\n", item._raw_data)
+                self.assertEqual(json.loads(item._raw_data), item_data["data"])
+                self.assertEqual(item.type, item_data["data"]["type"])
+
+    def test_materialized_on_data_access(self):
+        pm = self.load(lazy=True)
+        item = pm.vaults["V1" + "x" * 40 + "=="].items[1]
+        pm.to_json()
+        pm.find_item_by_uuid("uuid-1-1")
+        self.assertFalse(item.is_materialized)
+        self.assertEqual(item.data.content.username, "user1")
+        self.assertTrue(item.is_materialized)
+        self.assertSameExport(pm)
+
+
+class LookupTest(unittest.TestCase):
+    """
+    Tests of the maintained indexes behind find_item, find_item_by_uuid, get_vault and Vault.get_item.
+    """
+    def setUp(self):
+        self.pm = build_password_manager(make_export(vaults=2, items=5))
+        self.first, self.second = self.pm.vaults.values()
+
+    def test_lookups(self):
+        item = self.second.items[3]
+        self.assertIs(self.pm.find_item(item.itemId), item)
+        self.assertIs(self.pm.find_item_by_uuid(item.data.metadata.itemUuid), item)
+        self.assertIs(self.second.get_item(item.itemId), item)
+        self.assertIsNone(self.first.get_item(item.itemId))
+        self.assertIs(self.pm.get_vault("Vault 1"), self.second)
+        for missing in (self.pm.find_item, self.pm.find_item_by_uuid, self.pm.get_vault, self.first.get_item):
+            self.assertIsNone(missing("missing"))
+
+    def test_maintained_by_the_methods(self):
+        self.first.add_item(itemId="new", data=proton_vault.Data(proton_vault.Metadata("New", "", "new-uuid"), [], "note"))
+        self.assertIs(self.pm.find_item("new"), self.first.items[-1])
+        self.assertIs(self.pm.find_item_by_uuid("new-uuid"), self.first.items[-1])
+        self.first.remove_item("new")
+        self.assertIsNone(self.pm.find_item("new"))
+        self.pm.rename_vault(self.first.vault_id, "Renamed")
+        self.assertIs(self.pm.get_vault("Renamed"), self.first)
+        self.assertIsNone(self.pm.get_vault("Vault 0"))
+        self.pm.remove_vault(self.second.vault_id)
+        self.assertIsNone(self.pm.find_item(self.second.items[0].itemId))
+
+    def test_first_item_wins(self):
+        duplicate = self.second.items[0]
+        self.first.add_item(itemId=duplicate.itemId)
+        self.assertIs(self.pm.find_item(duplicate.itemId), duplicate)
+        self.second.remove_item(duplicate.itemId)
+        self.assertIs(self.pm.find_item(duplicate.itemId), self.first.items[-1])
+
+    def test_direct_changes(self):
+        # Replacing or resizing the vaults and items lists is detected, changing an ID in place needs reindex()
+        item = proton_vault.Item("appended", self.first.vault_id)
+        self.first.items.append(item)
+        self.assertIs(self.pm.find_item("appended"), item)
+        self.second.items = self.second.items[:2]
+        self.assertIsNone(self.pm.find_item("I1_3=="))
+        self.pm.vaults["direct"] = proton_vault.Vault("direct", "Direct", "")
+        self.assertIs(self.pm.get_vault("Direct"), self.pm.vaults["direct"])
+        item = self.first.items[0]
+        old_id, item.itemId = item.itemId, "changed"
+        self.assertIsNone(self.pm.find_item(old_id))
+        self.pm.reindex()
+        self.assertIs(self.pm.find_item("changed"), item)
+        self.assertIs(self.first.get_item("changed"), item)
+
+    def test_misses_do_not_scan(self):
+        self.pm.find_item("missing")
+        with mock.patch.object(proton_vault.Item, "itemId", new=property(lambda item: self.fail("item scanned"))):
+            self.assertIsNone(self.pm.find_item("missing"))
+            self.assertIsNone(self.pm.find_item_by_uuid("missing"))
+            self.assertIsNone(self.first.get_item("missing"))
+
+
+class QueryTest(ExportTestCase):
+    """
+    Tests of PasswordManager.query against a scan of the items.
+    """
+    def scan(self, pm, type=None, state=None, vault_id=None, created=(None, None), modified=(None, None)):
+        def in_range(value, low, high):
+            return (low is None or value > low) and (high is None or value < high)
+
+        return sorted(item.itemId for item_vault_id, vault in pm.vaults.items() for item in vault.items
+                      if (type is None or item.type == type) and (state is None or item.state == state)
+                      and (vault_id is None or item_vault_id == vault_id)
+                      and in_range(item.createTime, *created) and in_range(item.modifyTime, *modified))
+
+    def assertQuery(self, pm, **criteria):
+        scan_criteria = {key: criteria[key] for key in ("type", "state") if key in criteria}
+        if "vault" in criteria:
+            scan_criteria["vault_id"] = pm.vaults[criteria["vault"]].vault_id if criteria["vault"] in pm.vaults else pm.get_vault(criteria["vault"]).vault_id
+        scan_criteria["created"] = criteria.get("created_after"), criteria.get("created_before")
+        scan_criteria["modified"] = criteria.get("modified_after"), criteria.get("modified_before")
+        self.assertEqual(sorted(item.itemId for item in pm.query(**criteria)), self.scan(pm, **scan_criteria), criteria)
+
+    def test_criteria(self):
+        middle = 1680000000 + 20 * 123457
+        for lazy in (False, True):
+            pm = self.load(lazy=lazy)
+            for criteria in ({}, {"type": "login"}, {"type": "alias"}, {"state": 2}, {"vault": "Vault 2"},
+                             {"vault": next(iter(pm.vaults))}, {"type": "note", "state": 1, "vault": "Vault 0"},
+                             {"created_after": middle}, {"created_before": middle, "type": "login"},
+                             {"modified_after": 1690000000, "modified_before": 1690000000 + 20 * 98765},
+                             {"modified_before": 0}):
+                self.assertQuery(pm, **criteria)
+            self.assertEqual(pm.query(vault="missing"), [])
+            self.assertEqual(pm.query(created_after=datetime.datetime.fromtimestamp(middle, datetime.timezone.utc)),
+                             pm.query(created_after=middle))
+
+    def test_maintained(self):
+        pm = self.load()
+        pm.query(type="login")
+        vault = pm.get_vault("Vault 1")
+        vault.add_item(itemId="new", data=proton_vault.Data(proton_vault.Metadata("New", "", "new"), [], "login"), state=1, createTime=1)
+        self.assertQuery(pm, type="login")
+        self.assertEqual([item.itemId for item in pm.query(created_before=2)], ["new"])
+        vault.remove_item("I1_1==")
+        self.assertQuery(pm, type="login", vault="Vault 1")
+        item = pm.find_item("I2_1==")
+        item.state = 3
+        pm.reindex_item(item)
+        self.assertEqual(pm.query(state=3), [item])
+
+
+def login(item_id, username, password, urls, name="Login", note=""):
+    """
+    Builds the add_item arguments of a login item.
+    :return: A dictionary of add_item arguments.
+    """
+    return {"itemId": item_id, "data": proton_vault.Data(proton_vault.Metadata(name, note, "uuid-" + item_id), [], "login",
+                                                         proton_vault.Content(username, password, urls, ""))}
+
+
+class UrlIndexTest(unittest.TestCase):
+    """
+    Tests of PasswordManager.items_for_url.
+    """
+    def setUp(self):
+        self.pm = proton_vault.PasswordManager()
+        self.vault = self.pm.add_vault(name="Logins")
+        self.vault.add_items([
+            login("a", "alice", "x", ["https://login.example.com/path"]),
+            login("b", "bob", "x", ["http://EXAMPLE.com:8080", "https://other.org"]),
+            login("c", "carol", "x", ["www.site.co.uk"]),
+            login("d", "dave", "x", ["https://bücher.example/"]),
+            login("e", "eve", "x", ["not a url", None]),
+        ])
+
+    def ids(self, url, match="domain"):
+        return sorted(item.itemId for item in self.pm.items_for_url(url, match))
+
+    def test_matches(self):
+        self.assertEqual(self.ids("https://www.example.com/login"), ["a", "b"])
+        self.assertEqual(self.ids("example.com", "suffix"), ["a", "b"])
+        self.assertEqual(self.ids("login.example.com", "suffix"), ["a"])
+        self.assertEqual(self.ids("example.com", "host"), ["b"])
+        self.assertEqual(self.ids("https://mail.site.co.uk"), ["c"])
+        self.assertEqual(self.ids("co.uk", "host"), [])
+        self.assertEqual(self.ids("https://BÜCHER.example"), ["d"])
+        self.assertEqual(self.ids("https://unknown.net"), [])
+        with self.assertRaises(ValueError):
+            self.pm.items_for_url("example.com", "prefix")
+
+    def test_maintained(self):
+        self.assertEqual(self.ids("other.org"), ["b"])
+        self.vault.add_item(**login("f", "frank", "x", ["https://www.other.org"]))
+        self.vault.remove_item("b")
+        self.assertEqual(self.ids("other.org"), ["f"])
+
+    def test_lazy_items_are_not_materialized(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "export.json")
+            proton_vault.save_password_manager_to_json_file(self.pm, path)
+            pm = proton_vault.load_password_manager_from_json_file(path, lazy=True)
+        self.assertEqual(sorted(item.itemId for item in pm.items_for_url("example.com")), ["a", "b"])
+        self.assertFalse(any(item.is_materialized for vault in pm.vaults.values() for item in vault.items))
+
+
+class SearchTest(unittest.TestCase):
+    """
+    Tests of PasswordManager.search.
+    """
+    def setUp(self):
+        self.pm = proton_vault.PasswordManager()
+        self.vault = self.pm.add_vault(name="Logins")
+        self.vault.add_items([
+            login("bank", "alice", "hunter2", ["https://bank.example.com"], name="My Bank", note="savings account"),
+            login("mail", "alice", "s3cret", ["https://mail.example.org"], name="Webmail"),
+            login("shop", "bob", "hunter2", ["https://shop.example.net"], name="Shopping", note="bank card"),
+        ])
+
+    def ids(self, text, **kwargs):
+        return [item.itemId for item in self.pm.search(text, **kwargs)]
+
+    def test_ranking(self):
+        # A word of the name weighs more than the same word in a note
+        self.assertEqual(self.ids("bank"), ["bank", "shop"])
+        self.assertEqual(self.ids("bank", limit=1), ["bank"])
+        self.assertEqual(self.ids("alice webmail"), ["mail", "bank"])
+        self.assertEqual(self.ids("example.org"), ["mail", "bank", "shop"])
+
+    def test_substrings_and_typos(self):
+        self.assertEqual(self.ids("shopp"), ["shop"])
+        self.assertEqual(self.ids("savins"), ["bank"])
+        self.assertEqual(self.ids("savins", fuzzy=False), [])
+
+    def test_secrets_are_not_indexed_by_default(self):
+        self.assertEqual(self.ids("hunter2"), [])
+        self.assertEqual(sorted(self.ids("hunter2", include_secrets=True)), ["bank", "shop"])
+
+    def test_maintained(self):
+        self.vault.add_item(**login("new", "carol", "x", [], name="Savings"))
+        self.assertEqual(self.ids("savings")[0], "new")
+        self.vault.remove_item("bank")
+        self.assertEqual(self.ids("savings"), ["new"])
+
+
+class AuditTest(unittest.TestCase):
+    """
+    Tests of PasswordManager.audit_credentials.
+    """
+    def setUp(self):
+        self.pm = proton_vault.PasswordManager()
+        first = self.pm.add_vault(vault_id="first", name="First")
+        second = self.pm.add_vault(vault_id="second", name="Second")
+        first.add_items([
+            login("a", "Alice", "shared", ["https://example.com/login"]),
+            login("b", "bob", "shared", ["https://example.com"]),
+            login("c", "carol", "unique", ["https://other.org"]),
+            login("d", "", "", ["https://other.org"]),
+        ])
+        second.add_items([
+            login("e", "alice", "shared", ["http://EXAMPLE.com:8080/", "https://example.com/again"]),
+            login("f", "carol", "different", ["other.org"]),
+        ])
+
+    def test_report(self):
+        report = self.pm.audit_credentials(key=b"key")
+        self.assertEqual([[(item["vaultId"], item["itemId"]) for item in cluster["items"]] for cluster in report.reuse_clusters],
+                         [[("first", "a"), ("first", "b"), ("second", "e")]])
+        self.assertEqual([(group["username"], group["host"], [item["itemId"] for item in group["items"]]) for group in report.duplicate_groups],
+                         [("alice", "example.com", ["a", "e"]), ("carol", "other.org", ["c", "f"])])
+        self.assertNotIn("shared", report.to_json())
+
+    def test_keyed_fingerprints(self):
+        fingerprint = self.pm.audit_credentials(key=b"key").reuse_clusters[0]["fingerprint"]
+        self.assertEqual(self.pm.audit_credentials(key=b"key").reuse_clusters[0]["fingerprint"], fingerprint)
+        self.assertNotEqual(self.pm.audit_credentials(key=b"other").reuse_clusters[0]["fingerprint"], fingerprint)
+        self.assertNotEqual(self.pm.audit_credentials().reuse_clusters[0]["fingerprint"], fingerprint)
+
+
+@unittest.skipIf(proton_vault.numpy is None, "numpy is not installed")
+class PasswordStrengthTest(unittest.TestCase):
+    """
+    Tests of PasswordManager.score_password_strength.
+    """
+    passwords = ["", "password", "aaaaaaaa", "abcdefgh", "9876543210", "Tr0ub4dor&3", "correct horse battery staple", "pässwörd-Ω1"]
+
+    def setUp(self):
+        self.pm = proton_vault.PasswordManager()
+        vault = self.pm.add_vault(name="Logins")
+        vault.add_items([login(str(index), "user", password, []) for index, password in enumerate(self.passwords)])
+        vault.add_item(itemId="note", type="note")
+
+    def test_scores(self):
+        Scores = proton_vault.PasswordStrengthScores
+        result = self.pm.score_password_strength(batch_size=3)
+        self.assertEqual(result.item_ids, [str(index) for index in range(len(self.passwords))] + ["note"])
+        scores = {item_id: score for item_id, score in zip(result.item_ids, result.scores)}
+        self.assertEqual([int(scores[str(index)]["length"]) for index in range(len(self.passwords))], [len(password) for password in self.passwords])
+        self.assertEqual(scores["0"]["flags"], 0)
+        self.assertEqual(scores["note"]["length"], 0)
+        self.assertTrue(scores["1"]["flags"] & Scores.COMMON)
+        self.assertTrue(scores["2"]["flags"] & Scores.REPEATED)
+        self.assertTrue(scores["3"]["flags"] & Scores.SEQUENTIAL)
+        self.assertTrue(scores["4"]["flags"] & Scores.SEQUENTIAL and scores["4"]["flags"] & Scores.DIGITS_ONLY)
+        self.assertEqual(scores["5"]["classes"], Scores.LOWER | Scores.UPPER | Scores.DIGIT | Scores.SYMBOL)
+        self.assertAlmostEqual(float(scores["5"]["entropy"]), 11 * math.log2(26 + 26 + 10 + 33), places=3)
+        self.assertEqual(scores["6"]["flags"], 0)
+        self.assertEqual(scores["7"]["classes"], Scores.LOWER | Scores.DIGIT | Scores.SYMBOL)
+
+    def test_weak_items(self):
+        result = self.pm.score_password_strength()
+        self.assertEqual(result.weak_item_ids(), ["1", "2", "3", "4"])
+        self.assertEqual(result.weak_item_ids(min_entropy=70), ["1", "2", "3", "4", "7"])
+        self.assertEqual(result.weak_item_ids(min_entropy=0), ["1", "2", "3", "4"])
+        self.assertEqual(len(result), len(self.passwords) + 1)
+
+
+class CacheTest(ExportTestCase):
+    """
+    Tests of the binary cache of the loads given a cache_dir, keyed by the SHA-256 of the export.
+    """
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp(dir=self.directory)
+        # Lets the clock tick past the last change of the exports, or their path records are never trusted
+        time.sleep(0.05)
+
+    def entries(self):
+        return sorted(name for name in os.listdir(self.cache_dir) if name.endswith(".pvcache"))
+
+    def test_miss_then_hit(self):
+        for _ in range(2):
+            self.assertRoundTrip(self.json_path, cache_dir=self.cache_dir)
+        self.assertEqual(len(self.entries()), 1)
+
+    def test_hits_do_not_parse(self):
+        copy_path = self.path("copy.json")
+        shutil.copyfile(self.json_path, copy_path)
+        self.load(cache_dir=self.cache_dir)
+        with mock.patch.object(proton_vault, "_iter_export_records", side_effect=AssertionError("export parsed")), \
+                mock.patch.object(proton_vault, "_file_sha256", wraps=proton_vault._file_sha256) as file_sha256:
+            self.assertRoundTrip(self.json_path, cache_dir=self.cache_dir)
+            self.assertEqual(file_sha256.call_count, 0)
+            # A copy of the export is hashed, and shares the entry of the original
+            self.assertRoundTrip(copy_path, cache_dir=self.cache_dir)
+            self.assertEqual(file_sha256.call_count, 1)
+        self.assertEqual(len(self.entries()), 1)
+
+    def test_edit_keeping_the_size_and_modification_time(self):
+        path = self.path("edited.json")
+        shutil.copyfile(self.json_path, path)
+        stat = os.stat(path)
+        self.load(path, cache_dir=self.cache_dir)
+        with open(path, "rb") as file:
+            content = file.read()
+        with open(path, "wb") as file:
+            file.write(content.replace(b'"Vault 0"', b'"Vault 9"'))
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual((os.stat(path).st_size, os.stat(path).st_mtime_ns), (stat.st_size, stat.st_mtime_ns))
+        for lazy in (False, True):
+            pm = self.load(path, lazy=lazy, cache_dir=self.cache_dir)
+            self.assertIsNotNone(pm.get_vault("Vault 9"))
+            self.assertIsNone(pm.get_vault("Vault 0"))
+        self.assertEqual(len(self.entries()), 2)
+
+    def test_damaged_entry_is_rewritten(self):
+        self.load(cache_dir=self.cache_dir)
+        entry, = self.entries()
+        with open(os.path.join(self.cache_dir, entry), "r+b") as file:
+            file.truncate(100)
+        self.assertRoundTrip(self.json_path, cache_dir=self.cache_dir)
+        self.assertGreater(os.path.getsize(os.path.join(self.cache_dir, entry)), 100)
+
+
+class DiffTest(ExportTestCase):
+    """
+    Tests of diff and Changeset.apply.
+    """
+    def edited_export(self):
+        export = json.loads(json.dumps(self.export))
+        export["version"] = "1.2.0"
+        first, second, third = export["vaults"].values()
+        first["name"] = "Renamed"
+        del first["items"][3]
+        first["items"][5]["data"]["metadata"]["name"] = "Edited"
+        first["items"][5]["modifyTime"] += 1
+        second["items"].append(dict(second["items"][0], itemId="added=="))
+        del export["vaults"][next(reversed(export["vaults"]))]
+        export["vaults"]["Vnew=="] = dict(third, name="New", items=third["items"][:2])
+        return export
+
+    def test_diff_and_apply(self):
+        edited = self.edited_export()
+        edited_path = self.path("edited.json")
+        with open(edited_path, "w", encoding="utf-8") as file:
+            json.dump(edited, file)
+        expected = build_password_manager(edited).to_json()
+        for old, new in ((self.json_path, edited_path), (self.baseline, build_password_manager(edited))):
+            changeset = proton_vault.diff(old, new)
+            self.assertEqual((len(changeset.added_items), len(changeset.removed_items), len(changeset.modified_items)), (3, 1, 1))
+            self.assertEqual(changeset.removed_vaults, [next(reversed(self.export["vaults"]))])
+            changeset = proton_vault.Changeset.from_json(changeset.to_json())
+            for lazy in (False, True):
+                pm = changeset.apply(self.load(lazy=lazy))
+                self.assertEqual(pm.to_json(), expected)
+                self.assertEqual(pm.get_vault("New").items[1].itemId, "I2_1==")
+        self.assertFalse(proton_vault.diff(self.json_path, self.baseline))
+
+    def test_failed_apply_leaves_the_manager_untouched(self):
+        changeset = proton_vault.diff(self.json_path, build_password_manager(self.edited_export()))
+        missing = proton_vault.Changeset.from_json(changeset.to_json())
+        missing.removed_items.append({"vaultId": next(iter(self.export["vaults"])), "itemId": "missing"})
+        unknown_vault = proton_vault.Changeset.from_json(changeset.to_json())
+        unknown_vault.added_items.append({"vaultId": "missing", "item": changeset.added_items[0]["item"]})
+        malformed = proton_vault.Changeset.from_json(changeset.to_json())
+        malformed.added_items.append({"vaultId": next(iter(self.export["vaults"])), "item": {"itemId": "malformed"}})
+        for bad, error in ((missing, ValueError), (unknown_vault, ValueError), (malformed, KeyError)):
+            pm = self.load()
+            with self.assertRaises(error):
+                bad.apply(pm)
+            self.assertSameExport(pm)
+
+
+class MergeTest(ExportTestCase):
+    """
+    Tests of merge_exports.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        other = json.loads(json.dumps(cls.export))
+        other["userId"] = "OTHER=="
+        first = next(iter(other["vaults"].values()))
+        first["items"][0]["data"]["metadata"]["name"] = "Newer"
+        first["items"][0]["modifyTime"] += 100
+        copy = json.loads(json.dumps(first["items"][1]))
+        copy["itemId"] = "copy=="
+        copy["data"]["metadata"]["itemUuid"] = "uuid-copy"
+        fresh = json.loads(json.dumps(first["items"][2]))
+        fresh["itemId"] = "fresh=="
+        fresh["data"]["metadata"].update(name="Fresh", itemUuid="uuid-fresh")
+        other["vaults"]["Vnew=="] = {"name": "New", "description": "", "display": {"color": 0, "icon": 0}, "items": [copy, fresh]}
+        cls.other_path = os.path.join(cls.directory, "other.json")
+        with open(cls.other_path, "w", encoding="utf-8") as file:
+            json.dump(other, file)
+
+    def merge(self, policy="newest", parallel=None, **kwargs):
+        return proton_vault.merge_exports([self.json_path, self.other_path], policy, parallel, **kwargs)
+
+    def test_duplicates_within_and_across_exports(self):
+        # The items of the other vaults of the export only differ from the first vault by their IDs and itemUuid
+        merged = proton_vault.merge_exports([self.json_path], parallel=None)
+        first, *others = merged.vaults.values()
+        self.assertEqual([item.to_dict() for item in first.items], [item.to_dict() for item in self.baseline.vaults[first.vault_id].items])
+        self.assertEqual([len(vault.items) for vault in others], [0, 0])
+        for parallel in (None, 2):
+            self.assertEqual(proton_vault.merge_exports([self.json_path, self.json_path], parallel=parallel).to_json(), merged.to_json())
+
+    def test_policies(self):
+        first_id = next(iter(self.export["vaults"]))
+        original = self.baseline.vaults[first_id].items[0].data.metadata.name
+        # "last" keeps the copy of the first item in the last vault of the other export, with the original name
+        for policy, name, second_id in (("newest", "Newer", "I0_1=="), ("oldest", original, "I0_1=="),
+                                        ("first", original, "I0_1=="), ("last", original, "copy=="),
+                                        (lambda kept, item: item if item.itemId == "copy==" else kept, original, "copy==")):
+            pm = self.merge(policy)
+            self.assertEqual(pm.user_id, "USER==")
+            self.assertEqual(sum(len(vault.items) for vault in pm.vaults.values()), 41)
+            first = pm.vaults[first_id]
+            self.assertEqual((first.items[0].data.metadata.name, first.items[1].itemId), (name, second_id))
+            self.assertEqual(first.items[1].shareId, first_id)
+            self.assertEqual([item.itemId for item in pm.vaults["Vnew=="].items], ["fresh=="])
+            self.assertIs(pm.find_item(second_id), first.items[1])
+
+    def test_parallel_and_output(self):
+        output = self.path("merged.json")
+        expected = self.merge().to_json()
+        self.assertEqual(self.merge(parallel=2, output=output).to_json(), expected)
+        self.assertEqual(self.load(output).to_json(), expected)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            self.merge("largest")
+
+
+class SQLiteStoreTest(ExportTestCase):
+    """
+    Tests of SQLiteStore, checked against the same changes made to a password manager.
+    """
+    def setUp(self):
+        self.pm = self.load()
+        self.store = proton_vault.SQLiteStore.from_password_manager(self.load(lazy=True), self.path("store.db"), batch_size=7)
+        self.addCleanup(os.remove, self.path("store.db"))
+        self.addCleanup(self.store.close)
+
+    def assertSameAsManager(self):
+        for indent in (None, 4):
+            self.assertEqual("".join(self.store.iter_json(indent=indent)), self.pm.to_json(indent=indent))
+
+    def test_round_trip(self):
+        self.assertSameAsManager()
+        for lazy in (False, True):
+            self.assertSameExport(self.store.load(lazy=lazy))
+        self.store.save_json(self.path("store.json"), atomic=True)
+        self.assertSameExport(self.load(self.path("store.json")))
+
+    def test_item_changes(self):
+        first, second, _ = self.pm.vaults.values()
+        item = self.store.get_item("I0_7==")
+        self.assertEqual(item.to_dict(), first.items[7].to_dict())
+        self.assertIsNone(self.store.get_item("missing"))
+        item.data.metadata.name = "Edited"
+        item.data.content.urls = ["https://login.example.org"]
+        self.store.put_item(item)
+        self.assertEqual([item.itemId for item in self.store.items_for_url("example.org")], ["I0_7=="])
+        first.items[7] = item
+        self.pm.reindex()
+        added = proton_vault.Item(None, second.vault_id, name="Added", type="login")
+        self.store.put_item(added)
+        second.add_item(itemId=added.itemId, data=added.data)
+        self.assertSameAsManager()
+        self.store.remove_item(added.itemId)
+        second.remove_item(added.itemId)
+        self.store.rename_vault(first.vault_id, "Renamed")
+        self.pm.rename_vault(first.vault_id, "Renamed")
+        self.assertSameAsManager()
+        self.assertEqual(self.store.load().to_json(), self.pm.to_json())
+        with self.assertRaises(ValueError):
+            self.store.remove_item("missing")
+        with self.assertRaises(ValueError):
+            self.store.put_item(added, "missing")
+        with self.assertRaises(ValueError):
+            self.store.rename_vault("missing", "Name")
+
+    def test_items_for_url(self):
+        for match in ("domain", "suffix", "host"):
+            for url in ("example1.com", "https://www.example2.com/login", "other.org"):
+                self.assertEqual([item.itemId for item in self.store.items_for_url(url, match)],
+                                 [item.itemId for item in self.pm.items_for_url(url, match)], (url, match))
+        with self.assertRaises(ValueError):
+            self.store.items_for_url("example1.com", "prefix")
+
+
+class ZipTest(ExportTestCase):
+    """
+    Tests of the zip exports, read and written without extracting the JSON to disk.
+    """
+    def test_round_trip(self):
+        zip_path = self.path("export.zip")
+        proton_vault.save_password_manager_to_zip_file(self.baseline, zip_path, atomic=True)
+        with zipfile.ZipFile(zip_path) as archive:
+            self.assertEqual(archive.namelist(), ["Proton Pass/data.json"])
+            self.assertEqual(archive.getinfo("Proton Pass/data.json").compress_type, zipfile.ZIP_DEFLATED)
+        self.assertRoundTrip(zip_path)
+        self.assertRoundTrip(zip_path, parallel=2)
+        with open(zip_path, "rb") as file:
+            self.assertSameExport(self.load(file))
+        self.assertEqual([item.to_dict() for _, _, item in proton_vault.iter_items(zip_path)],
+                         [item.to_dict() for vault in self.baseline.vaults.values() for item in vault.items])
+
+    def test_file_objects(self):
+        stream = io.BytesIO()
+        proton_vault.save_password_manager_to_zip_file(self.load(lazy=True), stream)
+        stream.seek(0)
+        self.assertSameExport(self.load(stream))
+        self.assertFalse(stream.closed)
+
+    def test_export_member(self):
+        # Without a data.json member, the only JSON member is read
+        zip_path = self.path("member.zip")
+        with zipfile.ZipFile(zip_path, "w") as archive:
+            archive.writestr("readme.txt", "export")
+            archive.write(self.json_path, "export/pass.json")
+        self.assertRoundTrip(zip_path)
+        with zipfile.ZipFile(zip_path, "w") as archive:
+            archive.writestr("readme.txt", "export")
+        with self.assertRaises(ValueError):
+            self.load(zip_path)
+
+
+@unittest.skipUnless(shutil.which("gpg"), "gpg is not installed")
+class PgpTest(ExportTestCase):
+    """
+    Tests of the encrypted exports, decrypted and encrypted by gpg as they are streamed.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.pgp_path = os.path.join(cls.directory, "export.pgp")
+        proton_vault.save_password_manager_to_json_file(cls.baseline, cls.pgp_path, atomic=True, passphrase=cls.passphrase)
+
+    def test_passphrase(self):
+        with open(self.pgp_path, "rb") as file:
+            self.assertTrue(file.read(64).startswith(b"-----BEGIN PGP MESSAGE-----"))
+        self.assertEqual(os.stat(self.pgp_path).st_mode & 0o777, 0o600)
+        self.assertRoundTrip(self.pgp_path, passphrase=self.passphrase)
+        self.assertRoundTrip(self.pgp_path, passphrase=self.passphrase, parallel=2)
+        with open(self.pgp_path, "rb") as file:
+            self.assertSameExport(self.load(file, passphrase=self.passphrase))
+        items = proton_vault.iter_items(self.pgp_path, passphrase=self.passphrase)
+        self.assertEqual(next(items)[2].itemId, "I0_0==")
+        items.close()
+
+    def test_errors(self):
+        for kwargs in ({}, {"passphrase": "wrong"}, {"passphrase": self.passphrase, "cache_dir": self.path("cache")}):
+            with self.assertRaises(ValueError, msg=kwargs):
+                self.load(self.pgp_path, **kwargs)
+        with self.assertRaises(ValueError):
+            self.load(self.json_path, passphrase=self.passphrase)
+        with open(self.pgp_path) as file:
+            lines = file.read().splitlines()
+        middle = len(lines) // 2
+        lines[middle] = ("B" if lines[middle].startswith("A") else "A") + lines[middle][1:]
+        with open(self.path("tampered.pgp"), "w") as file:
+            file.write("\n".join(lines) + "\n")
+        with self.assertRaises(ValueError):
+            self.load(self.path("tampered.pgp"), passphrase=self.passphrase)
+
+    def test_secret_key(self):
+        home = tempfile.mkdtemp(dir=self.directory)
+        environment = dict(os.environ, GNUPGHOME=home)
+
+        def gpg(*arguments):
+            return subprocess.run(["gpg", "--batch", "--pinentry-mode", "loopback", "--passphrase", "key passphrase"] + list(arguments),
+                                  env=environment, check=True, capture_output=True).stdout
+
+        try:
+            gpg("--quick-gen-key", "test@example.com", "future-default", "default", "never")
+            key = gpg("--armor", "--export-secret-keys").decode("ascii")
+            gpg("--trust-model", "always", "--recipient", "test@example.com", "--output", self.path("export.gpg"), "--encrypt", self.json_path)
+        finally:
+            subprocess.run(["gpgconf", "--kill", "gpg-agent"], env=environment, capture_output=True)
+        self.assertRoundTrip(self.path("export.gpg"), key=key, passphrase="key passphrase")
+        with self.assertRaises(ValueError):
+            self.load(self.path("export.gpg"), key=key, passphrase="wrong")
+
+
+class UniqueIdTest(unittest.TestCase):
+    """
+    Tests of generate_unique_id and generate_unique_ids, served from a pool of random IDs.
+    """
+    def test_format(self):
+        for unique_id in proton_vault.generate_unique_ids(1000) + [proton_vault.generate_unique_id()]:
+            self.assertRegex(unique_id, r"^[A-Za-z0-9]{86}==$")
+
+    def test_distinct_and_excluded(self):
+        taken = [["a", "b", "a", "c"], ["d", "e"]]
+        with mock.patch.object(proton_vault, "_take_ids", side_effect=lambda count: taken.pop(0)):
+            self.assertEqual(proton_vault.generate_unique_ids(4, exclude={"b"}), ["a", "c", "d", "e"])
+
+    @unittest.skipUnless(hasattr(os, "register_at_fork"), "fork is not available")
+    def test_forked_process(self):
+        # The pool is filled and its lock held, like by another thread, when the process forks
+        proton_vault.generate_unique_id()
+        pooled = set(proton_vault._id_pool)
+        read_fd, write_fd = os.pipe()
+        with proton_vault._id_pool_lock:
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    signal.alarm(10)
+                    os.write(write_fd, proton_vault.generate_unique_id().encode("ascii"))
+                finally:
+                    os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd, "rb") as reader:
+            child_id = reader.read().decode("ascii")
+        os.waitpid(pid, 0)
+        self.assertEqual(len(child_id), 88)
+        self.assertNotIn(child_id, pooled)
+
+
+class BulkInsertTest(unittest.TestCase):
+    """
+    Tests of Vault.add_items and PasswordManager.add_vaults.
+    """
+    def setUp(self):
+        self.pm = proton_vault.PasswordManager()
+        self.vault = self.pm.add_vault(name="Imported")
+
+    def test_add_items(self):
+        source = build_password_manager(make_export(vaults=1, items=10))
+        expected = [item.to_dict() for item in next(iter(source.vaults.values())).items]
+        self.pm.search("item")
+        created = self.vault.add_items(item.to_dict() for item in next(iter(source.vaults.values())).items)
+        self.assertEqual(self.vault.items, created)
+        self.assertEqual([dict(item.to_dict(), shareId=expected[0]["shareId"]) for item in created], expected)
+        self.assertIs(self.pm.find_item("I0_3=="), created[3])
+        self.assertIs(self.pm.find_item_by_uuid("uuid-0-4"), created[4])
+        self.assertEqual(len(self.pm.search("item")), 10)
+
+    def test_new_ids_and_tuples(self):
+        created = self.vault.add_items([{"name": "First", "type": "login"}, (None, None, 2, None, 1, 5, 6, "Second", "note")])
+        self.assertEqual(len({item.itemId for item in created}), 2)
+        self.assertRegex(created[0].itemId, r"^[A-Za-z0-9]{86}==$")
+        self.assertEqual((created[1].data.metadata.name, created[1].data.type, created[1].state, created[1].createTime), ("Second", "note", 2, 5))
+        self.assertIs(self.vault.get_item(created[1].itemId), created[1])
+
+    def test_add_vaults(self):
+        first, second = self.pm.add_vaults([{"name": "First", "display": {"color": 3, "icon": 1}}, ("second", "Second", "Description")])
+        self.assertEqual((first.display.color, first.display.icon), (3, 1))
+        self.assertIs(self.pm.get_vault("First"), first)
+        self.assertIs(self.pm.get_vault_by_id("second"), second)
+        self.assertEqual(second.description, "Description")
+        self.assertIs(self.pm.add_vault(name="Third"), self.pm.get_vault("Third"))
+
+    def test_invalid_entries_add_nothing(self):
+        for entries in ([{"name": "Good"}, 7], [{"nam": "Typo"}], [{"data": 5}], [{"name": "Good"}, {"data": {"metadata": {}}}]):
+            with self.assertRaises(ValueError, msg=entries):
+                self.vault.add_items(entries)
+        self.assertEqual(self.vault.items, [])
+        with self.assertRaises(ValueError):
+            self.pm.add_vaults([{"name": "Good"}, ("id", "name", "description", None, None, "extra")])
+        self.assertEqual(list(self.pm.vaults.values()), [self.vault])
+
+
+class ChangeTrackingTest(ExportTestCase):
+    """
+    Tests of the change tracking of PasswordManager.track_changes, reusing the JSON of the unchanged items.
+    """
+    def setUp(self):
+        self.pm = self.load(lazy=True)
+        self.pm.track_changes = True
+        self.vault = self.pm.vaults["V1" + "x" * 40 + "=="]
+
+    def full_json(self, indent=None):
+        self.pm.track_changes = False
+        try:
+            return self.pm.to_json(indent=indent)
+        finally:
+            self.pm.track_changes = True
+
+    def test_clean_items_are_not_encoded_again(self):
+        self.assertTrue(self.vault.items[0].is_dirty)
+        self.assertEqual(self.pm.to_json(), self.expected[0])
+        self.assertFalse(self.vault.is_dirty)
+        path = self.path("tracked.json")
+        with mock.patch.object(proton_vault.Item, "to_dict", side_effect=AssertionError("item encoded")):
+            self.assertEqual(self.pm.to_json(), self.expected[0])
+            proton_vault.save_password_manager_to_json_file(self.pm, path)
+        self.assertSameExport(self.load(path))
+        # The JSON is cached for one indentation, the last one serialized
+        self.assertEqual(self.pm.to_json(indent=4), self.expected[1])
+        self.assertFalse(self.vault.is_dirty)
+
+    def test_changes(self):
+        self.pm.to_json()
+        items = self.vault.items
+        items[1].modifyTime = 1
+        items[2].data.metadata.name = "Edited"
+        items[3] = proton_vault.Item("new==", self.vault.vault_id, name="New", type="note")
+        items[4].mark_dirty()
+        self.vault.name = "Renamed"
+        self.assertEqual([item.is_dirty for item in items[:6]], [False, True, True, True, True, False])
+        self.assertFalse(self.pm.vaults["V0" + "x" * 40 + "=="].is_dirty)
+        self.assertTrue(self.vault.is_dirty)
+        for indent in (None, 4, None):
+            self.assertEqual(self.pm.to_json(indent=indent), self.full_json(indent))
+        # An item whose data was handed out stays dirty, since the data may still be changed through it
+        data = items[2].data
+        self.pm.to_json()
+        data.metadata.note = "Changed later"
+        self.assertTrue(items[2].is_dirty)
+        self.assertIn("Changed later", self.pm.to_json())
+
+    def test_off_by_default(self):
+        pm = self.load(lazy=True)
+        pm.to_json()
+        self.assertTrue(all(item.is_dirty for vault in pm.vaults.values() for item in vault.items))
+
+
+class BenchmarkTest(unittest.TestCase):
+    """
+    Tests of the synthetic export generator and the runner of benchmark.py.
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def export(self, name, **kwargs):
+        path = os.path.join(self.directory, name)
+        benchmark.write_synthetic_export(path, **kwargs)
+        with open(path, "rb") as file:
+            return file.read()
+
+    def test_deterministic_export(self):
+        export = self.export("a.json", vaults=3, items=100, seed=7)
+        self.assertEqual(self.export("b.json", vaults=3, items=100, seed=7), export)
+        self.assertNotEqual(self.export("c.json", vaults=3, items=100, seed=8), export)
+        pm = proton_vault.load_password_manager_from_json_file(os.path.join(self.directory, "a.json"))
+        self.assertEqual([len(vault.items) for vault in pm.vaults.values()], [34, 33, 33])
+        self.assertEqual([item.itemId for vault in pm.vaults.values() for item in vault.items],
+                         [item["itemId"] for vault in json.loads(export)["vaults"].values() for item in vault["items"]])
+        self.export("notes.json", vaults=1, items=50, type_mix={"note": 1})
+        pm = proton_vault.load_password_manager_from_json_file(os.path.join(self.directory, "notes.json"))
+        self.assertEqual({item.type for item in pm.vaults.popitem()[1].items}, {"note"})
+
+    def test_results_and_comparison(self):
+        first, second = (os.path.join(self.directory, name) for name in ("first.json", "second.json"))
+        arguments = ["--items", "200", "--repeat", "1", "--lookups", "20", "--no-memory", "--workers", "0"]
+        with contextlib.redirect_stderr(io.StringIO()):
+            benchmark.main(arguments + ["--output", first])
+            with contextlib.redirect_stdout(io.StringIO()) as output:
+                benchmark.main(arguments + ["--output", second, "--compare", first])
+        with open(second) as file:
+            document = json.load(file)
+        self.assertEqual(document["meta"]["parameters"]["items"], 200)
+        names = [result["benchmark"] for result in document["results"]]
+        for name in ("load", "load_lazy", "save", "save_unchanged", "round_trip", "find_item", "find_item_miss"):
+            self.assertIn(name, names)
+        self.assertEqual(document["results"][0]["items"], 200)
+        self.assertIn("find_item_miss", output.getvalue())
+
+
+class InstrumentationTest(ExportTestCase):
+    """
+    Tests of the stage events reported to the instrumentation hooks.
+    """
+    def events(self, function):
+        events = []
+        with proton_vault.instrumentation(events.append):
+            result = function()
+        return result, [(event["operation"], event["stage"]) for event in events], events[-1] if events else None
+
+    def test_load(self):
+        for kwargs in ({}, {"lazy": True}, {"parallel": 2}):
+            pm, stages, total = self.events(lambda: self.load(**kwargs))
+            self.assertSameExport(pm)
+            self.assertEqual(stages, [("load", stage) for stage in ("read", "parse", "build", "index", "total")])
+            self.assertEqual((total["vaults"], total["items"], total["bytes"]), (3, 120, os.path.getsize(self.json_path)))
+            with open(self.json_path, encoding="utf-8") as file:
+                self.assertEqual(total["characters"], len(file.read()))
+            self.assertIn("allocated_blocks", total)
+        # A cache miss reports the load of the export, then the cache load as a whole
+        for expected in ([("load", "total"), ("cache_load", "total")], [("cache_load", "total")]):
+            _, stages, total = self.events(lambda: self.load(cache_dir=self.path("cache")))
+            self.assertEqual(stages[-len(expected):], expected)
+            self.assertEqual(total["items"], 120)
+
+    def test_save(self):
+        path = self.path("instrumented.json")
+        _, stages, total = self.events(lambda: proton_vault.save_password_manager_to_json_file(self.baseline, path))
+        self.assertEqual(stages, [("save", "serialize"), ("save", "write"), ("save", "total")])
+        self.assertEqual((total["bytes"], total["characters"]), (os.path.getsize(path), len(self.expected[0])))
+        _, stages, _ = self.events(lambda: proton_vault.save_password_manager_to_zip_file(self.baseline, self.path("instrumented.zip")))
+        self.assertEqual(stages[-1], ("save", "total"))
+
+    def test_hooks_are_removed(self):
+        hook = proton_vault.add_instrumentation_hook(lambda event: None)
+        proton_vault.remove_instrumentation_hook(hook)
+        with self.assertRaises(ValueError):
+            proton_vault.remove_instrumentation_hook(hook)
+        self.assertEqual(proton_vault._instrumentation_hooks, [])
+        with mock.patch.object(proton_vault, "_StageTimer", side_effect=AssertionError("measured")):
+            self.assertSameExport(self.load())
+            proton_vault.save_password_manager_to_json_file(self.baseline, self.path("plain.json"))
+
+
+@unittest.skipIf(proton_vault.orjson is None, "orjson is not installed")
+class OrjsonCodecTest(unittest.TestCase):
+    """
+    Tests of OrjsonCodec.raw_decode, which decodes the long values with orjson, against JsonCodec.
+    """
+    def setUp(self):
+        self.codec = proton_vault.OrjsonCodec()
+        self.codec.raw_decode_size = 64
+        self.json_codec = proton_vault.JsonCodec()
+        export = make_export(vaults=2, items=6)
+        self.values = [export, export["vaults"], [1, 2.5, None, True, "é \U0001f511"], {"a": []}, "text", 12, [2 ** 70] * 10,
+                       [float("nan")] * 20]
+        self.text = " \n ,".join(json.dumps(value, ensure_ascii=False, indent=indent) for value, indent in zip(self.values, [None, 2] * 4))
+
+    def decode_all(self, codec, text):
+        values = []
+        pos = 0
+        while pos < len(text):
+            value, pos = codec.raw_decode(text, pos)
+            values.append((value, pos))
+            pos = text.find(",", pos) + 1 or len(text)
+        return values
+
+    def test_same_values_and_ends_as_json(self):
+        expected = self.decode_all(self.json_codec, self.text)
+        self.assertEqual(len(expected), len(self.values))
+        self.assertEqual(repr(self.decode_all(self.codec, self.text)), repr(expected))
+
+    def test_long_values_are_decoded_by_orjson(self):
+        # Without the 20-digit lastRevision of make_export, which may not fit in 64 bits and is left to json
+        value = [{"name": "item {}".format(i), "urls": ["https://example.com/{}".format(i)], "pinned": i % 2 == 0}
+                 for i in range(50)]
+        text = json.dumps(value) + ", []"
+        with mock.patch.object(self.codec.decoder, "raw_decode", wraps=self.codec.decoder.raw_decode) as raw_decode:
+            self.assertEqual(self.codec.raw_decode(text), self.json_codec.raw_decode(text))
+        # json only tried the first raw_decode_size characters
+        self.assertEqual(raw_decode.call_count, 1)
+
+    def test_errors(self):
+        text = json.dumps(self.values[0])
+        for invalid in (text.replace("null", "nul", 1), text.replace(":", "", 1)):
+            with self.assertRaises(json.JSONDecodeError) as expected:
+                self.json_codec.raw_decode(invalid)
+            with self.assertRaises(json.JSONDecodeError) as error:
+                self.codec.raw_decode(invalid)
+            self.assertEqual((error.exception.msg, error.exception.pos), (expected.exception.msg, expected.exception.pos))
+        # A value cut short by the end of the string fails at its end, so that the streaming reader reads more
+        with self.assertRaises(json.JSONDecodeError) as error:
+            self.codec.raw_decode(text[:len(text) // 2])
+        self.assertGreaterEqual(error.exception.pos, len(text) // 2 - proton_vault._TRUNCATED_VALUE_SIZE)
+
+    def test_streaming_reader(self):
+        export = make_export(vaults=2, items=30)
+        for chunk_size in (1, 7, 100, 4096):
+            reader = proton_vault._JsonStreamReader(io.StringIO(json.dumps(export, indent=2)), chunk_size=chunk_size, codec=self.codec)
+            self.assertEqual({key: reader.read_value() for key in reader.iter_object()}, export)
+
+
+class AsyncExportsTest(ExportTestCase):
+    """
+    Tests of the asynchronous loads, saves and item iterations, in threads and in worker processes.
+    """
+    def run_exports(self, coroutine, executor=None):
+        async def main():
+            async with proton_vault.AsyncExports(max_concurrency=2, executor=executor) as exports:
+                return await coroutine(exports)
+        return asyncio.run(main())
+
+    def test_load_save_and_iter_items(self):
+        async def round_trip(exports):
+            pms = await asyncio.gather(*(exports.load(self.json_path, lazy=lazy) for lazy in (False, True)))
+            await asyncio.gather(*(exports.save(pm, self.path("async{}.json".format(i))) for i, pm in enumerate(pms)))
+            items = [(vault_id, item.itemId) async for vault_id, _, item in exports.iter_items(self.json_path, batch_size=7)]
+            return pms, items
+
+        for executor in (None, 2):
+            pms, items = self.run_exports(round_trip, executor)
+            for i, pm in enumerate(pms):
+                self.assertSameExport(pm)
+                self.assertSameExport(self.load(self.path("async{}.json".format(i))))
+            self.assertEqual(items, [(vault_id, item.itemId) for vault_id, vault in self.baseline.vaults.items() for item in vault.items])
+
+    def test_event_loop_stays_responsive(self):
+        # Full collections in the executor threads would block the loop while they scan the objects built so far
+        path = self.path("large.json")
+        benchmark.write_synthetic_export(path, vaults=4, items=10000)
+        collections = []
+
+        def callback(phase, info):
+            if phase == "start" and info["generation"] == 2:
+                collections.append(info)
+
+        async def load(exports):
+            lags = []
+            done = asyncio.Event()
+
+            async def tick():
+                while not done.is_set():
+                    start = time.perf_counter()
+                    await asyncio.sleep(0.005)
+                    lags.append(time.perf_counter() - start - 0.005)
+
+            ticker = asyncio.create_task(tick())
+            await asyncio.gather(*(exports.load(path) for _ in range(2)))
+            done.set()
+            await ticker
+            return lags
+
+        gc.callbacks.append(callback)
+        try:
+            lags = self.run_exports(load)
+        finally:
+            gc.callbacks.remove(callback)
+        self.assertEqual(collections, [])
+        self.assertLess(max(lags), 0.1)
+        self.assertTrue(gc.isenabled())
+
+    def test_gc_pauses_are_counted(self):
+        entered = threading.Event()
+        leave = threading.Event()
+
+        def pause():
+            with proton_vault._gc_paused(any_thread=True):
+                entered.set()
+                leave.wait()
+
+        thread = threading.Thread(target=pause)
+        thread.start()
+        entered.wait()
+        with proton_vault._gc_paused():
+            self.assertFalse(gc.isenabled())
+        # The pause of the thread is still in progress
+        self.assertFalse(gc.isenabled())
+        leave.set()
+        thread.join()
+        self.assertTrue(gc.isenabled())
+        # Other threads only pause the collector when asked to
+        enabled = []
+
+        def load():
+            with proton_vault._gc_paused():
+                enabled.append(gc.isenabled())
+
+        thread = threading.Thread(target=load)
+        thread.start()
+        thread.join()
+        self.assertEqual(enabled, [True])
+
+
+class ShardTest(ExportTestCase):
+    """
+    Tests of the exports split into shards, with a shard per vault or shards of fixed size, plain or encrypted.
+    """
+    def shard(self, items_per_shard=None, source=None, **kwargs):
+        directory = tempfile.mkdtemp(dir=self.directory)
+        return proton_vault.shard_export(source or self.json_path, directory, items_per_shard, **kwargs)
+
+    def assertSameItems(self, sharded):
+        expected = [(vault_id, vault.name, item.to_dict()) for vault_id, vault in self.baseline.vaults.items() for item in vault.items]
+        for lazy in (False, True):
+            self.assertEqual([(vault_id, name, item.to_dict()) for vault_id, name, item in sharded.iter_items(lazy=lazy)], expected)
+        first, _, third = self.baseline.vaults
+        self.assertEqual([(vault_id, name, item.to_dict()) for vault_id, name, item in sharded.iter_items([first, third])],
+                         [value for value in expected if value[0] in (first, third)])
+        for vault_id, vault in self.baseline.vaults.items():
+            for item in vault.items[::9]:
+                self.assertEqual(sharded.get_item(item.itemId).to_dict(), item.to_dict())
+                self.assertEqual(sharded.get_item(item.itemId, vault_id, lazy=False).to_dict(), item.to_dict())
+            self.assertEqual(sharded.get_vault_by_id(vault_id).to_json(), vault.to_json())
+        self.assertIsNone(sharded.get_item("I0_0==", third))
+        self.assertIsNone(sharded.get_item("missing"))
+
+    def test_shard_per_vault(self):
+        sharded = self.shard()
+        self.assertEqual(len(sharded.shards), 3)
+        self.assertEqual(len(sharded), 120)
+        self.assertEqual(sharded.list_vaults_name(), ["Vault 0", "Vault 1", "Vault 2"])
+        self.assertSameItems(sharded)
+        self.assertSameExport(sharded.load())
+
+    def test_shards_of_fixed_size(self):
+        sharded = self.shard(items_per_shard=7)
+        self.assertEqual(len(sharded.shards), 18)
+        self.assertEqual([shard["items"] for shard in sharded.shards], [7] * 17 + [1])
+        self.assertSameItems(sharded)
+        self.assertEqual("".join(sharded.iter_json(indent=4)), self.expected[1])
+        sharded.save_json(self.path("unsharded.json"))
+        self.assertSameExport(self.load(self.path("unsharded.json")))
+        with self.assertRaises(ValueError):
+            self.shard(items_per_shard=0)
+
+    def test_encrypted(self):
+        pgp_path = self.path("export.pgp")
+        proton_vault.save_password_manager_to_json_file(self.baseline, pgp_path, passphrase=self.passphrase)
+        sharded = self.shard(items_per_shard=60, source=pgp_path, passphrase=self.passphrase)
+        for name in os.listdir(sharded.directory):
+            with open(os.path.join(sharded.directory, name), "rb") as file:
+                self.assertTrue(file.read(64).startswith(b"-----BEGIN PGP MESSAGE-----"), name)
+        with self.assertRaises(ValueError):
+            proton_vault.ShardedPasswordManager(sharded.directory)
+        sharded = proton_vault.ShardedPasswordManager(sharded.directory, passphrase=self.passphrase)
+        self.assertEqual(len(sharded.shards), 2)
+        item = self.baseline.vaults["V1" + "x" * 40 + "=="].items[3]
+        self.assertEqual(sharded.get_item(item.itemId).to_dict(), item.to_dict())
+        self.assertEqual([item.itemId for _, _, item in sharded.iter_items()],
+                         [item.itemId for vault in self.baseline.vaults.values() for item in vault.items])
+        self.assertEqual(sum(len(pm.vaults) for pm in sharded.iter_shards()), 4)
+        # An export encrypted to a key gives no passphrase to encrypt the shards with
+        with self.assertRaises(ValueError):
+            self.shard(source=pgp_path, key="key")
+
+
+if __name__ == "__main__":
+    unittest.main()